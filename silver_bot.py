@@ -1,34 +1,104 @@
 from __future__ import annotations
 
+import io
 import os
 import re
 import time
+import random
 import html
 import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 PHUQUY_SILVER_URL = "https://giabac.phuquygroup.vn/"
 REQUEST_TIMEOUT = 20
 
 TELEGRAM_RETRIES = 3
 TELEGRAM_RETRY_DELAY = 3
+TELEGRAM_MAX_RETRY_DELAY = 30  # retry_after lớn hơn -> bỏ cuộc, không treo job
 
 GIST_FILE_NAME = "silver_price_snapshot.txt"
+GIST_RAW_FP_FILE_NAME = "silver_price_raw_fp.txt"
+RAW_FP_NONE = "-"  # không bao giờ trùng fingerprint hex -> compare luôn parse lại
 SNAPSHOT_PATH = "silver_snapshot.txt"
+TABLE_PATH = "silver_table.json"
+RAW_FP_PATH = "silver_raw_fp.txt"
+GIST_CACHE_PATH = ".gist_cache.json"
 SCREENSHOT_PATH = "silver_table.png"
 
+# font đi kèm repo (đủ dấu tiếng Việt), không phụ thuộc font hệ thống
+TABLE_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "DejaVuSans.ttf")
+TABLE_FONT_SIZE = 28
+TABLE_PADDING = 32
+TABLE_HEADER = ("Sản phẩm", "Đơn vị", "Mua vào", "Bán ra")
 
-@dataclass
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0 Safari/537.36"
+)
+
+
+def _new_session() -> requests.Session:
+    """
+    Session dùng chung cho mọi HTTP call: giữ keep-alive để retry / GET+PATCH
+    cùng host không phải bắt tay TCP+TLS lại.
+    """
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    sess.headers.update({"User-Agent": USER_AGENT})
+    return sess
+
+
+SESSION = _new_session()
+
+_WS_RE = re.compile(r"\s+")
+_NONDIGIT_RE = re.compile(r"\D")
+
+# Bảng giá có cấu trúc cố định (#priceListContainer > table > tbody > tr > td x4)
+# -> bóc bằng regex, không cần dựng DOM
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+# chỉ tên thuộc tính không phân biệt hoa thường; giá trị id phải khớp đúng (như selector #priceListContainer)
+_CONTAINER_RE = re.compile(r"""<(\w+)\b[^>]*(?<![\w-])(?i:id)\s*=\s*["']?priceListContainer(?=["'\s/>])[^>]*>""")
+_TABLE_RE = re.compile(r"<table\b.*?</table>", re.S | re.I)
+_TBODY_RE = re.compile(r"<tbody\b[^>]*>(.*?)</tbody>", re.S | re.I)
+_ROW_RE = re.compile(r"<tr\b[^>]*>(.*?)</tr>", re.S | re.I)
+_CELL_RE = re.compile(r"<td\b([^>]*)>(.*?)</td>", re.S | re.I)
+_COLSPAN_RE = re.compile(r"""(?<![\w-])colspan\s*=\s*["']?(\d+)""", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+_DIGEST_RE = re.compile(r"[0-9a-f]{32}")
+
+
+@dataclass(slots=True, frozen=True)
 class SilverItem:
+    """
+    name/unit luôn đã qua normalize_text (parse_silver_table đảm bảo),
+    nơi dùng không cần normalize lại.
+    group: tiêu đề nhóm (dòng colspan=4) phía trên, chỉ dùng khi vẽ ảnh,
+    không nằm trong snapshot/hash.
+    """
     name: str
     unit: str
     buy: Optional[int]
     sell: Optional[int]
+    group: str = ""
+
+
+@dataclass
+class GistSnapshot:
+    text: str = ""
+    raw_fp: str = ""
+    digest: str = ""  # snapshot_hash(text), lưu ở description của Gist
 
 
 def log(msg: str) -> None:
@@ -37,7 +107,7 @@ def log(msg: str) -> None:
 
 def normalize_text(s: str) -> str:
     s = (s or "").replace("\u00a0", " ").strip()
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", s)
     return s
 
 
@@ -45,7 +115,7 @@ def parse_vnd_commas(value: str) -> Optional[int]:
     value = (value or "").strip()
     if value in ("", "-", "—"):
         return None
-    digits = re.sub(r"[^\d]", "", value)
+    digits = _NONDIGIT_RE.sub("", value)
     return int(digits) if digits else None
 
 
@@ -55,67 +125,145 @@ def format_vnd(value: Optional[int]) -> str:
     return f"{value:,.0f}".replace(",", ".")
 
 
-def sha256_text(s: str) -> str:
-    return hashlib.sha256((s or "").encode("utf-8")).hexdigest()
+def _hash_lines(lines: Iterable[str]) -> str:
+    """
+    Hash từng dòng (đã strip) nối bằng "\\n", không cần dựng cả chuỗi snapshot.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for line in lines:
+        h.update(line.strip().encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def snapshot_hash(text: str) -> str:
+    """
+    Hash của snapshot_text (vd. đọc từ Gist), khớp với canonical_snapshot_and_hash.
+    """
+    text = (text or "").replace("\u00a0", " ").replace("\r\n", "\n").strip()
+    return _hash_lines(text.split("\n"))
 
 
-def canonical_snapshot(items: List[SilverItem]) -> str:
+def canonical_snapshot_and_hash(items: List[SilverItem]) -> Tuple[str, List[str]]:
+    """
+    Trả về (hash, lines). Chỉ khi có thay đổi mới cần "\\n".join(lines) để lưu.
+    """
     rows = []
     for it in items:
-        name = normalize_text(it.name)
-        unit = normalize_text(it.unit)
         buy = "" if it.buy is None else str(int(it.buy))
         sell = "" if it.sell is None else str(int(it.sell))
-        rows.append((name, unit, buy, sell))
+        rows.append((it.name, it.unit, buy, sell))
     rows.sort(key=lambda x: (x[0], x[1]))
-    return "\n".join([f"{n} | {u} | {b} | {s}" for n, u, b, s in rows]).strip()
+    lines = [f"{n} | {u} | {b} | {s}" for n, u, b, s in rows]
+    return _hash_lines(lines), lines
 
 
-def fetch_silver_page() -> str:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
-    resp = requests.get(PHUQUY_SILVER_URL, headers=headers, timeout=REQUEST_TIMEOUT)
+def save_table_items(path: str, items: List[SilverItem]) -> None:
+    """
+    Lưu items theo đúng thứ tự trên trang (kèm group) để notify vẽ ảnh giống trang.
+    """
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(items))
+
+
+def load_table_items(path: str) -> List[SilverItem]:
+    try:
+        with open(path, "rb") as f:
+            rows = orjson.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return []
+    return [SilverItem(**row) for row in rows]
+
+
+def parse_snapshot_text(text: str) -> List[SilverItem]:
+    """
+    Ngược lại của canonical_snapshot_and_hash: "name | unit | buy | sell" -> SilverItem.
+    Thứ tự đã bị sort theo tên và không còn tiêu đề nhóm.
+    """
+    items: List[SilverItem] = []
+    for line in (text or "").splitlines():
+        parts = [p.strip() for p in line.rsplit("|", 3)]
+        if len(parts) != 4:
+            continue
+        name, unit, buy, sell = parts
+        items.append(SilverItem(
+            name=name,
+            unit=unit,
+            buy=int(buy) if buy else None,
+            sell=int(sell) if sell else None,
+        ))
+    return items
+
+
+def fetch_silver_page() -> Tuple[str, str]:
+    """
+    Trả về (html, raw_fp). raw_fp là fingerprint của body thô, dùng để bỏ qua
+    parse khi trang không đổi byte nào so với lần trước.
+    """
+    resp = SESSION.get(PHUQUY_SILVER_URL, timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
-    return resp.text
+    raw_fp = hashlib.blake2b(resp.content, digest_size=16).hexdigest()
+    return resp.text, raw_fp
+
+
+def _cell_text(cell_html: str) -> str:
+    return normalize_text(html.unescape(_TAG_RE.sub(" ", cell_html)))
+
+
+def _element_inner_html(page_html: str, start_tag: re.Match) -> str:
+    """
+    Nội dung bên trong element mở bởi start_tag (đếm lồng nhau cùng tên thẻ).
+    """
+    tag_re = re.compile(rf"<(/?){start_tag.group(1)}\b[^>]*>", re.I)
+    depth = 1
+    for m in tag_re.finditer(page_html, start_tag.end()):
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            return page_html[start_tag.end():m.start()]
+    return page_html[start_tag.end():]
 
 
 def parse_silver_table(page_html: str) -> List[SilverItem]:
-    soup = BeautifulSoup(page_html, "html.parser")
-    container = soup.select_one("#priceListContainer")
+    # dòng giá bị comment-out không được tính là dòng thật
+    page_html = _COMMENT_RE.sub("", page_html)
+
+    container = _CONTAINER_RE.search(page_html)
     if not container:
         raise RuntimeError("Không tìm thấy #priceListContainer")
 
-    table = container.find("table")
+    table = _TABLE_RE.search(_element_inner_html(page_html, container))
     if not table:
         raise RuntimeError("Không tìm thấy table trong #priceListContainer")
 
+    # chỉ lấy dòng trong tbody (như select("tbody tr") trước đây)
+    body = "".join(_TBODY_RE.findall(table.group(0)))
+
     items: List[SilverItem] = []
-    for tr in table.select("tbody tr"):
-        tds = tr.find_all("td")
+    group = ""
+    for row in _ROW_RE.finditer(body):
+        tds = _CELL_RE.findall(row.group(1))
         if not tds:
             continue
 
-        # bỏ dòng tiêu đề nhóm colspan=4
-        if len(tds) == 1 and (tds[0].get("colspan") in ("4", 4)):
-            continue
+        # dòng tiêu đề nhóm colspan=4: không phải dòng giá, chỉ ghi nhớ tên nhóm
+        if len(tds) == 1:
+            colspan = _COLSPAN_RE.search(tds[0][0])
+            if colspan and colspan.group(1) == "4":
+                group = _cell_text(tds[0][1])
+                continue
 
         if len(tds) < 4:
             continue
 
-        name = normalize_text(tds[0].get_text(" ", strip=True))
-        unit = normalize_text(tds[1].get_text(" ", strip=True))
-        buy = parse_vnd_commas(tds[2].get_text(" ", strip=True))
-        sell = parse_vnd_commas(tds[3].get_text(" ", strip=True))
+        name = _cell_text(tds[0][1])
+        unit = _cell_text(tds[1][1])
+        buy = parse_vnd_commas(_cell_text(tds[2][1]))
+        sell = parse_vnd_commas(_cell_text(tds[3][1]))
 
         if not name or (buy is None and sell is None):
             continue
 
-        items.append(SilverItem(name=name, unit=unit, buy=buy, sell=sell))
+        items.append(SilverItem(name=name, unit=unit, buy=buy, sell=sell, group=group))
 
     if not items:
         raise RuntimeError("Parse được 0 dòng giá bạc")
@@ -126,23 +274,92 @@ def get_gist_token() -> Optional[str]:
     return (os.getenv("GIST_TOKEN") or os.getenv("TOKEN_GIST") or "").strip() or None
 
 
-def load_snapshot_from_gist(token: str, gist_id: str) -> str:
+@functools.lru_cache(maxsize=1)
+def _github_session(token: str) -> requests.Session:
+    """
+    Session riêng cho api.github.com (đã gắn sẵn Authorization):
+    GET rồi PATCH cùng Gist sẽ đi chung một kết nối keep-alive.
+    """
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+    sess.mount("https://", adapter)
+    sess.headers.update({
+        "User-Agent": USER_AGENT,
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json",
+    })
+    return sess
+
+
+def _load_gist_cache(gist_id: str) -> dict:
+    try:
+        with open(GIST_CACHE_PATH, "rb") as f:
+            cache = orjson.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("gist_id") != gist_id:
+        return {}
+    return cache
+
+
+def _save_gist_cache(gist_id: str, etag: str, snap: GistSnapshot) -> None:
+    cache = {"gist_id": gist_id, "etag": etag, "text": snap.text, "raw_fp": snap.raw_fp, "digest": snap.digest}
+    try:
+        with open(GIST_CACHE_PATH, "wb") as f:
+            f.write(orjson.dumps(cache))
+    except OSError as e:
+        log(f"⚠️ Không ghi được {GIST_CACHE_PATH}: {e}")
+
+
+def load_snapshot_from_gist(token: str, gist_id: str) -> GistSnapshot:
+    """
+    Conditional GET (If-None-Match) với ETag đã cache ở GIST_CACHE_PATH:
+    304 -> dùng lại snapshot trong cache, không tải/parse body.
+    """
     url = f"https://api.github.com/gists/{gist_id}"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    cache = _load_gist_cache(gist_id)
+    headers = {"If-None-Match": cache["etag"]} if cache.get("etag") else {}
+    resp = _github_session(token).get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if resp.status_code == 304:
+        return GistSnapshot(
+            text=cache.get("text") or "",
+            raw_fp=cache.get("raw_fp") or "",
+            digest=cache.get("digest") or "",
+        )
     if resp.status_code == 404:
-        return ""
+        return GistSnapshot()
     resp.raise_for_status()
-    data = resp.json()
-    file_obj = data.get("files", {}).get(GIST_FILE_NAME)
-    return (file_obj or {}).get("content") or ""
-
-
-def save_snapshot_to_gist(token: str, gist_id: str, text: str) -> None:
+    data = orjson.loads(resp.content)
+    files = data.get("files", {})
+    # description chỉ được coi là hash khi đúng định dạng (Gist cũ có thể là mô tả tự do)
+    description = (data.get("description") or "").strip()
+    snap = GistSnapshot(
+        text=(files.get(GIST_FILE_NAME) or {}).get("content") or "",
+        raw_fp=((files.get(GIST_RAW_FP_FILE_NAME) or {}).get("content") or "").strip(),
+        digest=description if _DIGEST_RE.fullmatch(description) else "",
+    )
+    etag = resp.headers.get("ETag")
+    if etag:
+        _save_gist_cache(gist_id, etag, snap)
+    return snap
+
+
+def save_snapshot_to_gist(token: str, gist_id: str, text: str, raw_fp: str = "") -> None:
     url = f"https://api.github.com/gists/{gist_id}"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    payload = {"files": {GIST_FILE_NAME: {"content": text}}}
-    resp = requests.patch(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+    # luôn ghi đè fingerprint cùng snapshot, để fingerprint cũ không đi kèm snapshot mới
+    # (Gist không nhận content rỗng -> thiếu fingerprint thì ghi RAW_FP_NONE)
+    files = {
+        GIST_FILE_NAME: {"content": text},
+        GIST_RAW_FP_FILE_NAME: {"content": raw_fp or RAW_FP_NONE},
+    }
+    # hash snapshot ở description -> lần compare sau khỏi hash lại text cũ
+    payload = {"description": snapshot_hash(text), "files": files}
+    resp = _github_session(token).patch(
+        url,
+        data=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=REQUEST_TIMEOUT,
+    )
     resp.raise_for_status()
 
 
@@ -175,51 +392,136 @@ def build_caption() -> str:
     return f"🥈 Giá bạc Phú Quý\n⏱ {datetime.now().strftime('%H:%M %d/%m/%Y')}"
 
 
+def _telegram_retry_delay(err: Exception, attempt: int) -> Optional[float]:
+    """
+    Thời gian chờ trước lần thử tiếp theo, None = không nên thử lại.
+    - 429: theo parameters.retry_after của Telegram (quá TELEGRAM_MAX_RETRY_DELAY -> bỏ cuộc)
+    - 5xx: exponential backoff + jitter
+    - 4xx khác: thử lại vô ích
+    - lỗi kết nối / khác: delay cố định
+    """
+    resp = getattr(err, "response", None)
+    if resp is None:
+        return TELEGRAM_RETRY_DELAY
+    status = resp.status_code
+    if status == 429:
+        try:
+            retry_after = orjson.loads(resp.content).get("parameters", {}).get("retry_after")
+            retry_after = float(retry_after) if retry_after is not None else None
+        except (ValueError, TypeError, AttributeError):
+            retry_after = None
+        if retry_after is None:
+            return TELEGRAM_RETRY_DELAY
+        if retry_after > TELEGRAM_MAX_RETRY_DELAY:
+            return None
+        return max(retry_after, 0.0)
+    if status >= 500:
+        delay = TELEGRAM_RETRY_DELAY * 2 ** (attempt - 1) + random.uniform(0, 0.5)
+        return min(delay, TELEGRAM_MAX_RETRY_DELAY)
+    if status >= 400:
+        return None
+    return TELEGRAM_RETRY_DELAY
+
+
 def send_telegram_photo(bot_token: str, chat_id: str, photo_path: str, caption: str) -> None:
     url = f"https://api.telegram.org/bot{bot_token}/sendPhoto"
     last_err: Optional[Exception] = None
 
+    # đọc ảnh một lần, các lần retry gửi lại từ bộ nhớ
+    with open(photo_path, "rb") as f:
+        photo_bytes = f.read()
+    photo_name = os.path.basename(photo_path)
+    data = {"chat_id": chat_id, "caption": caption}
+
     for attempt in range(1, TELEGRAM_RETRIES + 1):
         try:
-            with open(photo_path, "rb") as f:
-                files = {"photo": f}
-                data = {"chat_id": chat_id, "caption": caption}
-                r = requests.post(url, data=data, files=files, timeout=REQUEST_TIMEOUT, proxies={"http": None, "https": None})
+            files = {"photo": (photo_name, io.BytesIO(photo_bytes), "image/png")}
+            r = SESSION.post(url, data=data, files=files, timeout=REQUEST_TIMEOUT, proxies={"http": None, "https": None})
             r.raise_for_status()
             return
         except Exception as e:
             last_err = e
             log(f"❌ sendPhoto error attempt {attempt}: {e}")
+            delay = _telegram_retry_delay(e, attempt)
+            if delay is None:
+                break
             if attempt < TELEGRAM_RETRIES:
-                time.sleep(TELEGRAM_RETRY_DELAY)
+                time.sleep(delay)
 
     raise RuntimeError("Gửi Telegram ảnh thất bại") from last_err
 
 
-def capture_table_screenshot(out_path: str = SCREENSHOT_PATH) -> str:
+def render_table_png(items: List[SilverItem], out_path: str = SCREENSHOT_PATH) -> str:
     """
-    Chỉ được gọi khi CHẮC CHẮN có thay đổi.
-    Lazy import Playwright để không phụ thuộc khi chạy compare.
+    Vẽ bảng giá ra PNG bằng Pillow, thay cho chụp màn hình bằng browser.
+    Giữ thứ tự items, chèn dòng tiêu đề nhóm mỗi khi item.group đổi.
+    Lazy import Pillow để không phụ thuộc khi chạy compare.
     """
-    from playwright.sync_api import sync_playwright
+    from PIL import Image, ImageDraw, ImageFont
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page(viewport={"width": 1100, "height": 900}, device_scale_factor=2)
-        page.goto(PHUQUY_SILVER_URL, wait_until="domcontentloaded", timeout=60000)
-        page.wait_for_selector("#priceListContainer", timeout=60000)
-        page.wait_for_timeout(800)
-        page.locator("#priceListContainer").screenshot(path=out_path)
-        browser.close()
+    # không fallback sang font mặc định: thiếu dấu tiếng Việt -> ảnh lỗi mà Gist vẫn bị cập nhật
+    try:
+        font = ImageFont.truetype(TABLE_FONT, TABLE_FONT_SIZE)
+    except OSError as e:
+        raise RuntimeError(f"Không load được font {TABLE_FONT}") from e
+
+    # mỗi phần tử: str = tiêu đề nhóm (trải cả 4 cột), tuple = dòng giá
+    rows: list = [TABLE_HEADER]
+    group = ""
+    for it in items:
+        if it.group and it.group != group:
+            rows.append(it.group)
+        group = it.group
+        rows.append((it.name, it.unit, format_vnd(it.buy), format_vnd(it.sell)))
+
+    # độ rộng cột tính theo pixel (font tiếng Việt đầy đủ thường không monospace)
+    c1 = c2 = c3 = c4 = 0.0
+    group_w = 0.0
+    for row in rows:
+        if isinstance(row, str):
+            group_w = max(group_w, font.getlength(row))
+            continue
+        a, b, c, d = row
+        c1 = max(c1, font.getlength(a))
+        c2 = max(c2, font.getlength(b))
+        c3 = max(c3, font.getlength(c))
+        c4 = max(c4, font.getlength(d))
+
+    gap = TABLE_PADDING
+    x1 = TABLE_PADDING
+    x2 = x1 + c1 + gap
+    x3 = x2 + c2 + gap + c3  # cột số căn phải
+    x4 = x3 + gap + c4
+    line_h = int(TABLE_FONT_SIZE * 1.6)
+    width = int(max(x4, x1 + group_w)) + TABLE_PADDING
+    height = line_h * len(rows) + 2 * TABLE_PADDING
+
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for i, row in enumerate(rows):
+        y = TABLE_PADDING + i * line_h
+        if isinstance(row, str):
+            draw.rectangle((TABLE_PADDING // 2, y - 4, width - TABLE_PADDING // 2, y + line_h - 10), fill="#eeeeee")
+            draw.text((x1, y), row, fill="#333333", font=font)
+            continue
+        a, b, c, d = row
+        draw.text((x1, y), a, fill="black", font=font)
+        draw.text((x2, y), b, fill="black", font=font)
+        draw.text((x3, y), c, fill="black", font=font, anchor="ra")
+        draw.text((x4, y), d, fill="black", font=font, anchor="ra")
+        if i == 0:
+            draw.line((TABLE_PADDING, y + line_h - 6, width - TABLE_PADDING, y + line_h - 6), fill="gray", width=2)
+    img.save(out_path)
     return out_path
 
 
-def cmd_compare() -> None:
+def cmd_compare() -> bool:
     """
-    1) Crawl + parse table -> snapshot_text
-    2) Load last snapshot from Gist
-    3) Compare hash
-    4) Write snapshot_text to SNAPSHOT_PATH
+    1) Crawl + load Gist song song -> raw fingerprint; trùng fingerprint trên Gist thì dừng sớm (changed=false)
+    2) Parse table -> hash snapshot
+    3) Compare hash với snapshot trên Gist
+    4) Nếu đổi: write snapshot_text to SNAPSHOT_PATH, items (thứ tự trang) to TABLE_PATH,
+       raw fingerprint to RAW_FP_PATH
     5) Set output changed=true/false
     """
     gist_token = get_gist_token()
@@ -228,23 +530,35 @@ def cmd_compare() -> None:
     if not gist_token or not gist_id:
         raise RuntimeError("Thiếu GIST token (GIST_TOKEN/TOKEN_GIST) hoặc GIST_ID")
 
-    items = parse_silver_table(fetch_silver_page())
-    snapshot_text = canonical_snapshot(items)
-    save_file(SNAPSHOT_PATH, snapshot_text)
-
-    last_text = load_snapshot_from_gist(gist_token, gist_id)
-    new_hash = sha256_text(snapshot_text)
-    old_hash = sha256_text((last_text or "").replace("\u00a0", " ").replace("\r\n", "\n").strip())
+    # Trang giá và Gist độc lập nhau -> gọi song song
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        page_future = pool.submit(fetch_silver_page)
+        gist_future = pool.submit(load_snapshot_from_gist, gist_token, gist_id)
+        page_html, raw_fp = page_future.result()
+        last = gist_future.result()
+    if last.raw_fp and last.raw_fp == raw_fp:
+        log(f"Raw HTML unchanged ({raw_fp[:8]}) -> skip parse")
+        write_output("changed", "false")
+        return False
+
+    items = parse_silver_table(page_html)
+    new_hash, lines = canonical_snapshot_and_hash(items)
+    old_hash = last.digest or snapshot_hash(last.text)
 
     changed = "true" if new_hash != old_hash else "false"
+    if changed == "true":
+        save_file(SNAPSHOT_PATH, "\n".join(lines).strip())
+        save_table_items(TABLE_PATH, items)
+        save_file(RAW_FP_PATH, raw_fp)
     log(f"Compare hash: {old_hash[:8]} -> {new_hash[:8]} changed={changed}")
     write_output("changed", changed)
+    return changed == "true"
 
 
 def cmd_notify() -> None:
     """
-    1) Read snapshot_text from SNAPSHOT_PATH
-    2) Render + screenshot
+    1) Read snapshot_text from SNAPSHOT_PATH, items from TABLE_PATH
+    2) Render table PNG (thứ tự + nhóm như trên trang)
     3) sendPhoto
     4) update Gist snapshot (ONLY after send success)
     """
@@ -262,11 +576,28 @@ def cmd_notify() -> None:
     if not snapshot_text:
         raise RuntimeError(f"Không có snapshot text ở {SNAPSHOT_PATH}")
 
-    img = capture_table_screenshot(SCREENSHOT_PATH)
+    items = load_table_items(TABLE_PATH)
+    if not items:
+        log(f"⚠️ Không có {TABLE_PATH}, vẽ từ snapshot (sort theo tên, không có nhóm)")
+        items = parse_snapshot_text(snapshot_text)
+
+    img = render_table_png(items, SCREENSHOT_PATH)
     send_telegram_photo(bot_token, chat_id, img, caption=build_caption())
 
-    save_snapshot_to_gist(gist_token, gist_id, snapshot_text)
-    log("✅ Notify done: sent screenshot + updated Gist snapshot")
+    raw_fp = load_file(RAW_FP_PATH).strip()
+    save_snapshot_to_gist(gist_token, gist_id, snapshot_text, raw_fp)
+    log("✅ Notify done: sent table image + updated Gist snapshot")
+
+
+def cmd_run() -> None:
+    """
+    compare + notify trong một lần chạy (cron ngoài GitHub Actions).
+    Chỉ vẽ + gửi ảnh khi compare báo có thay đổi.
+    """
+    if cmd_compare():
+        cmd_notify()
+    else:
+        log("No change -> skip notify")
 
 
 def main() -> None:
@@ -276,8 +607,10 @@ def main() -> None:
         cmd_compare()
     elif mode == "notify":
         cmd_notify()
+    elif mode == "run":
+        cmd_run()
     else:
-        raise SystemExit("Usage: python silver_bot.py compare|notify")
+        raise SystemExit("Usage: python silver_bot.py compare|notify|run")
 
 
 if __name__ == "__main__":